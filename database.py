@@ -22,7 +22,8 @@ database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    # Fail fast when the server is unreachable instead of blocking for the 30s default
+    _client = MongoClient(database_url, serverSelectionTimeoutMS=3000)
     db = _client[database_name]
 
 # Helper functions for common database operations